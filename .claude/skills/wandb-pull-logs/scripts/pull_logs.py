@@ -2,28 +2,62 @@
 """Pull W&B run metrics and hyperparameters (agent-optimized).
 
 Standalone utility that fetches from checkpoints (extracting wandb_run_path)
-or direct wandb run paths. Caches wandb data in checkpoints for fast subsequent access.
+or direct wandb run paths. Caches wandb data in sidecar files next to checkpoints
+(metadata as JSON, history as Feather) for fast subsequent access.
 """
 
 import argparse
-import csv
+import functools
+import hashlib
+import io
 import json
-import math
 import os
 import re
 import sys
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Any, List, Mapping, NoReturn, Optional
+from typing import Any, Callable, List, Mapping, NoReturn, Optional
 
 import numpy as np
 import pandas as pd
-import torch
+import pyarrow as pa
+from pyarrow import feather
+from pandas.errors import NumExprClobberingError
 
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import numexpr
+except ImportError:  # --eval falls back to pandas eval
+    numexpr = None
+
+
+# numexpr only beats plain numpy evaluation once frames are reasonably long
+NUMEXPR_MIN_ROWS = 10_000
+# min, p10, p25, p50, p75, p90, max for --stats
+STATS_QUANTILES = (0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0)
+
+# Cached wandb data is stored next to the checkpoint rather than inside it
+METADATA_SIDECAR_SUFFIX = ".wandb.json"
+HISTORY_SIDECAR_SUFFIX = ".wandb_history.feather"
 
 FILTER_EXPR_PATTERN = re.compile(
     r"^(?P<column>[a-zA-Z0-9_./-]+)\s*(?P<operator>>=|<=|==|!=|>|<)\s*(?P<value>[\d.eE+-]+)$"
 )
 
+FILTER_OPERATORS = {
+    ">": np.greater,
+    "<": np.less,
+    ">=": np.greater_equal,
+    "<=": np.less_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+
 
 def _die(message: str) -> NoReturn:
     print(f"Error: {message}", file=sys.stderr)
@@ -32,42 +66,210 @@ def _die(message: str) -> NoReturn:
 
 def _is_numeric_summary_val(val: Any) -> bool:
     """True if value is a displayable numeric (int/float, not NaN)."""
-    if val is None:
-        return False
-    if isinstance(val, bool):
-        return False
-    if isinstance(val, (int, float)) and math.isnan(float(val)):
+    if isinstance(val, bool) or not isinstance(val, (int, float)):
         return False
-    return isinstance(val, (int, float))
+    # NaN is the only value not equal to itself
+    return val == val
 
 
 def _numeric_summary(summary: Mapping[str, Any]) -> dict:
     return {k: v for k, v in summary.items() if _is_numeric_summary_val(v)}
 
 
+def _sorted_dict(data: Mapping[str, Any]) -> dict:
+    """Copy a mapping with keys in sorted order so printers need not re-sort."""
+    return dict(sorted(data.items()))
+
+
 def _flatten_config(config: Mapping[str, Any], prefix: str = "") -> dict:
     """Flatten nested config dict to dot-notation keys."""
     flat = {}
-    for key, value in config.items():
-        full_key = f"{prefix}.{key}" if prefix else key
-        if isinstance(value, dict):
-            flat.update(_flatten_config(value, full_key))
-        else:
+    # Stack of (prefix, items iterator) so keys come out in depth-first order
+    stack = [(prefix, iter(config.items()))]
+    while stack:
+        current_prefix, items = stack[-1]
+        for key, value in items:
+            full_key = f"{current_prefix}.{key}" if current_prefix else key
+            if isinstance(value, dict):
+                stack.append((full_key, iter(value.items())))
+                break
             flat[full_key] = value
+        else:
+            stack.pop()
     return flat
 
 
 def _load_checkpoint(path: str) -> dict:
+    # torch is imported lazily: it is the slowest import by far and is only
+    # needed when a checkpoint has no metadata sidecar yet
+    import torch
+
+    # mmap leaves tensor storages on disk until touched (we only read metadata
+    # keys), but torch only supports it for the zip-based serialization format
+    mmap = zipfile.is_zipfile(path)
     try:
-        checkpoint = torch.load(path, map_location="cpu", weights_only=False)
-    except Exception as exc:
-        _die(f"Failed to load checkpoint '{path}': {exc}")
+        checkpoint = torch.load(path, map_location="cpu", mmap=mmap, weights_only=True)
+    except Exception:
+        # Arbitrary pickled objects need the full unpickler
+        try:
+            checkpoint = torch.load(path, map_location="cpu", mmap=mmap, weights_only=False)
+        except Exception as exc:
+            _die(f"Failed to load checkpoint '{path}': {exc}")
     if not isinstance(checkpoint, dict):
         _die(f"Checkpoint is not a dictionary: {path}")
     return checkpoint
 
 
-def _restore_history_from_cache(cache: dict) -> pd.DataFrame:
+def _history_sidecar_path(checkpoint_path: str) -> str:
+    return checkpoint_path + HISTORY_SIDECAR_SUFFIX
+
+
+def _metadata_sidecar_path(checkpoint_path: str) -> str:
+    return checkpoint_path + METADATA_SIDECAR_SUFFIX
+
+
+def _read_metadata_sidecar(checkpoint_path: str) -> Optional[dict]:
+    """Return the checkpoint's wandb metadata sidecar, or None if absent/unreadable."""
+    try:
+        with open(_metadata_sidecar_path(checkpoint_path)) as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return metadata if isinstance(metadata, dict) else None
+
+
+def _replace_file(path: str, write: Callable[[str], None]) -> None:
+    """Call write(tmp_path), then atomically move the result over path.
+
+    Readers (possibly another invocation, memory-mapping the old file) never
+    see a truncated or half-written file.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _write_metadata_sidecar(checkpoint_path: str, metadata: dict) -> None:
+    # Encode in memory first: json.dump() issues one write per encoded chunk
+    payload = json.dumps(metadata, indent=2, default=str)
+
+    def write(tmp_path: str) -> None:
+        with open(tmp_path, "w") as f:
+            f.write(payload)
+
+    _replace_file(_metadata_sidecar_path(checkpoint_path), write)
+
+
+def _checkpoint_stamp(checkpoint_path: str) -> dict:
+    """The checkpoint's mtime and size, recorded in the metadata sidecar."""
+    st = os.stat(checkpoint_path)
+    return {"checkpoint_mtime_ns": st.st_mtime_ns, "checkpoint_size": st.st_size}
+
+
+def _sidecar_is_current(metadata: dict, checkpoint_path: str) -> bool:
+    """False once the checkpoint has been overwritten since the sidecar was written
+    (e.g. best.pt re-saved by a new run), since its wandb_run_path may differ."""
+    try:
+        stamp = _checkpoint_stamp(checkpoint_path)
+    except OSError:
+        return False
+    return all(metadata.get(key) == value for key, value in stamp.items())
+
+
+def _save_checkpoint(checkpoint: dict, path: str) -> None:
+    """Rewrite a checkpoint via a temp file, since its tensors may be mmapped from path."""
+    import torch
+
+    # Replace the file a symlink points to (best.pt -> epoch_10.pt), not the link
+    _replace_file(os.path.realpath(path), functools.partial(torch.save, checkpoint))
+
+
+def _migrate_embedded_cache(checkpoint_path: str, checkpoint: dict) -> dict:
+    """Move a wandb_cache embedded by older versions into the sidecar files.
+
+    The checkpoint is rewritten once without the cache, after which lookups
+    only ever read the sidecars. Returns the sidecar metadata, or the embedded
+    cache as-is when the checkpoint's directory cannot be written.
+    """
+    embedded = {
+        "wandb_run_path": checkpoint.get("wandb_run_path"),
+        "wandb_cache": checkpoint.pop("wandb_cache"),
+    }
+    try:
+        history = _restore_history_from_cache(embedded["wandb_cache"], checkpoint_path)
+        cache = {k: v for k, v in embedded["wandb_cache"].items() if k != "history"}
+        cache.update(_write_history_sidecar(history, checkpoint_path))
+        _save_checkpoint(checkpoint, checkpoint_path)
+        metadata = {"wandb_run_path": embedded["wandb_run_path"], "wandb_cache": cache}
+        metadata.update(_checkpoint_stamp(checkpoint_path))
+        _write_metadata_sidecar(checkpoint_path, metadata)
+    except (OSError, RuntimeError):  # torch.save reports write failures as RuntimeError
+        return embedded
+    return metadata
+
+
+def _mtime_ns(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _read_checkpoint_metadata(checkpoint_path: str) -> dict:
+    """Return the checkpoint's wandb keys (wandb_run_path, wandb_cache).
+
+    Memoized per process. The key includes the checkpoint and sidecar mtimes,
+    so rewriting either file simply misses the old entry. Treat the result
+    as read-only.
+    """
+    path = os.path.abspath(checkpoint_path)
+    return _cached_checkpoint_metadata(
+        path, _mtime_ns(path), _mtime_ns(_metadata_sidecar_path(path))
+    )
+
+
+@functools.lru_cache(maxsize=8)
+def _cached_checkpoint_metadata(
+    checkpoint_path: str, checkpoint_mtime: Optional[int], sidecar_mtime: Optional[int]
+) -> dict:
+    """Prefer the JSON sidecar while it still matches the checkpoint; otherwise load
+    the checkpoint and keep only the wandb keys so the rest of the state dict can
+    be released."""
+    metadata = _read_metadata_sidecar(checkpoint_path)
+    if metadata and metadata.get("wandb_run_path") and _sidecar_is_current(metadata, checkpoint_path):
+        return metadata
+    checkpoint = _load_checkpoint(checkpoint_path)
+    if isinstance(checkpoint.get("wandb_cache"), dict) and checkpoint.get("wandb_run_path"):
+        return _migrate_embedded_cache(checkpoint_path, checkpoint)
+    return {key: checkpoint[key] for key in ("wandb_run_path", "wandb_cache") if key in checkpoint}
+
+
+def _restore_history_from_cache(cache: dict, checkpoint_path: str) -> Optional[pd.DataFrame]:
+    """Rebuild the cached history; None means the cache is stale and must be refetched."""
+    history_path = cache.get("history_path")
+    if history_path is not None:
+        # Relative to the checkpoint so the pair can be moved together
+        history_path = os.path.join(os.path.dirname(checkpoint_path), history_path)
+        try:
+            mtime = os.stat(history_path).st_mtime
+        except OSError:
+            return None
+        if mtime != cache.get("history_mtime"):
+            return None
+        # The step index round-trips through the Arrow pandas metadata
+        df = feather.read_table(history_path, memory_map=True).to_pandas()
+        if "step" in df.columns:  # sidecars written before the index was stored
+            df = df.set_index("step")
+        return df
+
+    # Legacy caches embedded the history in the checkpoint itself
     history = cache.get("history")
     if history is None:
         return pd.DataFrame()
@@ -89,18 +291,62 @@ def _restore_history_from_cache(cache: dict) -> pd.DataFrame:
     return df
 
 
-def _build_history_for_cache(history_df: pd.DataFrame) -> dict:
-    frame = history_df.reset_index()
-    if "step" not in frame.columns:
-        frame = frame.rename(columns={frame.columns[0]: "step"})
-    return frame.to_dict(orient="split")
+def _history_digest(history_df: pd.DataFrame) -> str:
+    """Content hash of a history frame: labels, dtypes, index and values."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr([(str(c), str(dt)) for c, dt in history_df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(history_df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _write_history_sidecar(
+    history_df: pd.DataFrame, checkpoint_path: str, previous: Optional[dict] = None
+) -> dict:
+    """Write history to a Feather file next to the checkpoint; return cache fields.
+
+    The write is skipped when ``previous`` (the cache being replaced) already
+    points at an untouched sidecar with the same content.
+    """
+    history_path = _history_sidecar_path(checkpoint_path)
+    fields = {
+        "history_path": os.path.basename(history_path),
+        "history_digest": _history_digest(history_df),
+    }
+    if previous and previous.get("history_digest") == fields["history_digest"]:
+        try:
+            mtime = os.stat(history_path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime is not None and mtime == previous.get("history_mtime"):
+            fields["history_mtime"] = mtime
+            return fields
+
+    # Store the index as Arrow metadata rather than materializing a step column
+    table = pa.Table.from_pandas(history_df.rename_axis("step"), preserve_index=True)
+    _replace_file(history_path, functools.partial(feather.write_feather, table))
+    fields["history_mtime"] = os.stat(history_path).st_mtime
+    return fields
+
+
+def _isna_array(frame: pd.DataFrame) -> np.ndarray:
+    """2-D missing-value mask, read straight off the buffer for all-float frames."""
+    dtypes = set(frame.dtypes)
+    if len(dtypes) == 1:
+        dtype = next(iter(dtypes))
+        if isinstance(dtype, np.dtype) and dtype.kind == "f":
+            return np.isnan(frame.to_numpy(copy=False))
+    return frame.isna().to_numpy()
 
 
 def _clean_history(history_df: pd.DataFrame) -> pd.DataFrame:
-    numeric_cols = history_df.select_dtypes(include=[np.number]).columns.tolist()
-    if not numeric_cols:
+    # Same selection as select_dtypes(include=[np.number]) (bools excluded,
+    # timedeltas kept), read straight off the dtypes without a filtered frame
+    numeric_cols = history_df.columns[[dt.kind in "iufcm" for dt in history_df.dtypes]]
+    if numeric_cols.empty:
         return pd.DataFrame()
-    cleaned = history_df[numeric_cols].dropna(how="all")
+    numeric = history_df[numeric_cols]
+    keep = ~_isna_array(numeric).all(axis=1)
+    cleaned = numeric if keep.all() else numeric[keep]
     if "_step" in cleaned.columns:
         cleaned = cleaned.set_index("_step")
     elif "step" in cleaned.columns:
@@ -109,31 +355,39 @@ def _clean_history(history_df: pd.DataFrame) -> pd.DataFrame:
     return cleaned
 
 
-def _has_history_data(history: Any) -> bool:
-    return history is not None and isinstance(history, pd.DataFrame) and not history.empty
-
-
 def _get_wandb_data(
-    run_path: str, checkpoint_path: Optional[str] = None, refresh: bool = False
+    run_path: str,
+    checkpoint_path: Optional[str] = None,
+    refresh: bool = False,
+    keys: Optional[List[str]] = None,
 ) -> dict:
     """Fetch wandb data, using cache if available.
 
+    ``keys`` restricts the downloaded history to those metrics. It only applies
+    without a checkpoint, since a cache must hold the full history.
+
     Returns dict with:
       - fetched_at: ISO timestamp
-      - config: flattened hyperparameters
-      - summary: final metric values
-      - history: pd.DataFrame with step as index, metrics as columns
+      - config: flattened hyperparameters, sorted by key
+      - summary: final metric values, sorted by key
+      - history: pd.DataFrame with step as index, metrics as columns (always a
+        DataFrame, possibly empty, so callers only need to check .empty)
       - name: run name
     """
-    checkpoint = _load_checkpoint(checkpoint_path) if checkpoint_path else None
-
     # Prefer checkpoint cache unless a refresh is requested.
     if checkpoint_path and not refresh:
-        cache = checkpoint.get("wandb_cache")
+        cache = _read_checkpoint_metadata(checkpoint_path).get("wandb_cache")
         if isinstance(cache, dict) and cache:
-            cache = cache.copy()
-            cache["history"] = _restore_history_from_cache(cache)
-            return cache
+            history = _restore_history_from_cache(cache, checkpoint_path)
+            if history is not None:
+                cache = {
+                    k: v for k, v in cache.items() if k not in ("history_path", "history_mtime", "history_digest")
+                }
+                # Sidecar caches are already sorted; legacy ones may not be
+                cache["config"] = _sorted_dict(cache.get("config", {}))
+                cache["summary"] = _sorted_dict(_numeric_summary(cache.get("summary", {})))
+                cache["history"] = history
+                return cache
 
     try:
         import wandb
@@ -146,48 +400,64 @@ def _get_wandb_data(
     except wandb.errors.CommError as e:
         _die(f"Could not fetch run '{run_path}': {e}")
 
-    history_clean = _clean_history(run.history())
+    history = None
+    if keys and checkpoint_path is None:
+        history = run.history(keys=keys)
+        # wandb drops rows missing any key, so one unknown key empties the frame.
+        # Fetch in full instead and let --select/--where report the bad name
+        if not set(keys).issubset(history.columns):
+            history = None
+    if history is None:
+        history = run.history()
+    history_clean = _clean_history(history)
 
     cache = {
         "fetched_at": datetime.now().isoformat(),
         "name": run.name,
-        "config": _flatten_config(dict(run.config)),
-        "summary": _numeric_summary(
-            {k: v for k, v in run.summary.items() if not k.startswith("_")}
+        "config": _sorted_dict(_flatten_config(run.config)),
+        "summary": _sorted_dict(
+            _numeric_summary({k: v for k, v in run.summary.items() if not k.startswith("_")})
         ),
         "history": history_clean,
     }
 
-    if checkpoint is not None:
-        cache_for_save = cache.copy()
-        cache_for_save["history"] = _build_history_for_cache(history_clean)
-        checkpoint["wandb_cache"] = cache_for_save
-        torch.save(checkpoint, checkpoint_path)
+    if checkpoint_path is not None:
+        # Cache lives in sidecar files, so the checkpoint itself is never rewritten
+        cache_for_save = {k: v for k, v in cache.items() if k != "history"}
+        previous = (_read_metadata_sidecar(checkpoint_path) or {}).get("wandb_cache")
+        cache_for_save.update(
+            _write_history_sidecar(history_clean, checkpoint_path, previous)
+        )
+        metadata = {"wandb_run_path": run_path, "wandb_cache": cache_for_save}
+        metadata.update(_checkpoint_stamp(checkpoint_path))
+        _write_metadata_sidecar(checkpoint_path, metadata)
 
     return cache
 
 
 def _select_metrics(history_df, pattern: str):
     """Filter DataFrame columns by exact name match."""
-    if history_df is None or history_df.empty:
+    if history_df.empty:
         return history_df
 
-    wanted = {p.strip() for p in pattern.split("|") if p.strip()}
+    wanted = frozenset(p.strip() for p in pattern.split("|") if p.strip())
     matching_cols = [c for c in history_df.columns if c in wanted]
     if not matching_cols:
-        missing = wanted - set(history_df.columns)
+        missing = wanted.difference(history_df.columns)
         print(
             f"Warning: No metrics match. Requested: {sorted(wanted)}. "
             f"Missing: {sorted(missing)}",
             file=sys.stderr,
         )
         return pd.DataFrame()
-    return history_df[matching_cols]
+    if len(matching_cols) == len(history_df.columns):
+        return history_df
+    return history_df.reindex(columns=matching_cols)
 
 
 def _filter_rows(history_df, expr: str):
     """Filter DataFrame rows using inequality expression."""
-    if history_df is None or history_df.empty:
+    if history_df.empty:
         return history_df
 
     match = FILTER_EXPR_PATTERN.match(expr.strip())
@@ -199,41 +469,93 @@ def _filter_rows(history_df, expr: str):
     val = float(match.group("value"))
 
     if col == "step":
-        series = history_df.index.to_series()
+        target = "index"
+        values = history_df.index.to_numpy()
     elif col not in history_df.columns:
         _die(f"Column not found: {col}")
     else:
         series = history_df[col]
+        if pd.api.types.is_extension_array_dtype(series.dtype):
+            # Nullable dtypes hold pd.NA, which neither numexpr nor numpy can compare
+            target = None
+            values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        else:
+            target = f"`{col}`"
+            values = series.to_numpy()
 
-    ops = {
-        ">": lambda x: x > val,
-        "<": lambda x: x < val,
-        ">=": lambda x: x >= val,
-        "<=": lambda x: x <= val,
-        "==": lambda x: x == val,
-        "!=": lambda x: x != val,
-    }
+    # Below NUMEXPR_MIN_ROWS parsing the query costs more than the numpy ufunc
+    if target is not None and len(history_df) >= NUMEXPR_MIN_ROWS:
+        try:
+            return history_df.query(f"{target} {op} {val!r}", engine="numexpr")
+        except (ImportError, NumExprClobberingError):
+            pass
 
-    mask = ops[op](series).fillna(False)
-    return history_df.loc[mask]
+    mask = FILTER_OPERATORS[op](values, val)
+    return history_df.iloc[mask]
 
 
-def _wrap_column_names(expr: str, columns: list) -> str:
-    """Wrap column names containing special chars in backticks for pandas eval."""
+@functools.lru_cache(maxsize=32)
+def _column_wrap_pattern(columns: tuple) -> Optional[re.Pattern]:
+    """Compile one alternation regex matching every non-identifier column name."""
     cols_to_wrap = sorted(
         [c for c in columns if not c.isidentifier()], key=len, reverse=True
     )
+    if not cols_to_wrap:
+        return None
+    alternation = "|".join(map(re.escape, cols_to_wrap))
+    return re.compile(rf"(?<![`\w])(?:{alternation})(?![`\w])")
+
+
+def _wrap_column_names(expr: str, columns: list) -> str:
+    """Wrap column names containing special chars in backticks for pandas eval."""
+    pattern = _column_wrap_pattern(tuple(columns))
+    if pattern is None:
+        return expr
+    return pattern.sub(lambda m: f"`{m.group(0)}`", expr)
 
-    result = expr
-    for col in cols_to_wrap:
-        pattern = re.escape(col)
-        result = re.sub(rf"(?<![`\w]){pattern}(?![`\w])", f"`{col}`", result)
-    return result
+
+@functools.lru_cache(maxsize=32)
+def _numexpr_translation(formula: str, columns: tuple) -> tuple:
+    """Rewrite a (backtick-wrapped) formula with plain aliases for numexpr.
+
+    Translated once per formula and column set, so every run evaluating the same
+    --eval reuses the expression numexpr has already compiled and cached.
+    Returns (expression, {alias: column name}); "step" may name the index.
+    """
+    names = sorted(set(columns) | {"step"}, key=len, reverse=True)
+    alternation = "|".join(map(re.escape, names))
+    pattern = re.compile(rf"`([^`]+)`|(?<![`\w])({alternation})(?![`\w])")
+    aliases = {}
+
+    def substitute(match: re.Match) -> str:
+        name = match.group(1) or match.group(2)
+        return aliases.setdefault(name, f"_c{len(aliases)}")
+
+    expression = pattern.sub(substitute, formula)
+    return expression, {alias: name for name, alias in aliases.items()}
+
+
+def _eval_formula(history_df: pd.DataFrame, formula: str):
+    """Evaluate formula with numexpr directly, falling back to pandas eval."""
+    if numexpr is not None:
+        expression, aliases = _numexpr_translation(formula, tuple(history_df.columns))
+        columns = history_df.columns
+        # Unknown (backticked) names are left to pandas, which reports them
+        if all(name in columns or name == "step" for name in aliases.values()):
+            try:
+                local_dict = {
+                    alias: (history_df[name] if name in columns else history_df.index).to_numpy()
+                    for alias, name in aliases.items()
+                }
+                return numexpr.evaluate(expression, local_dict=local_dict, global_dict={})
+            except Exception:
+                pass  # dtypes/syntax numexpr can't handle; pandas reports real errors
+    return history_df.eval(formula, engine="python")
 
 
 def _apply_eval(history_df, expr: str):
     """Compute a derived column using pandas eval."""
-    if history_df is None or history_df.empty:
+    if history_df.empty:
         return history_df
 
     if "=" not in expr:
@@ -248,7 +570,7 @@ def _apply_eval(history_df, expr: str):
     wrapped_formula = _wrap_column_names(formula, history_df.columns.tolist())
 
     try:
-        history_df[name] = history_df.eval(wrapped_formula)
+        history_df[name] = _eval_formula(history_df, wrapped_formula)
     except Exception as e:
         _die(f"Error evaluating '{expr}': {e}")
 
@@ -261,26 +583,57 @@ def _filter_nan_rows(history_df, hide_any_nan: bool = True):
     If hide_any_nan is True (default): drop rows where any value is NaN.
     If False: drop only rows where all values are NaN.
     """
-    if history_df is None or history_df.empty:
+    if history_df.empty:
         return history_df
-    how = "any" if hide_any_nan else "all"
-    return history_df.dropna(how=how)
+    # One pass over the NaN mask instead of dropna's per-column checks
+    isna = _isna_array(history_df)
+    drop = isna.any(axis=1) if hide_any_nan else isna.all(axis=1)
+    # Dense logs often have no gaps at all; skip the copy in that case
+    if not drop.any():
+        return history_df
+    return history_df[~drop]
+
+
+# Bound once so hot loops skip re-parsing the format spec; NaN formats as "nan"
+_format_float = "{:.4g}".format
 
 
 def _format_scalar(value: Any, precision: int = 4) -> str:
+    if isinstance(value, float):
+        return "nan" if value != value else f"{value:.{precision}g}"
+    if isinstance(value, (int, np.integer, str)):
+        return str(value)
     if pd.isna(value):
         return "nan"
-    if isinstance(value, float):
-        return f"{value:.{precision}g}"
     return str(value)
 
 
+def _cell_formatter(dtype) -> Callable[[Any], str]:
+    """Pick the cheapest formatter that matches _format_scalar for a column dtype."""
+    if isinstance(dtype, np.dtype):
+        if dtype.kind == "f":
+            return _format_float
+        if dtype.kind in "iub":
+            return str
+    return _format_scalar
+
+
 def _print_history_table(history: pd.DataFrame, file) -> None:
     cols = list(history.columns)
     print(f"# step | {' | '.join(cols)}", file=file)
-    for idx, row in history.iterrows():
-        values = [_format_scalar(row[c]) for c in cols]
-        print(f"{idx} | {' | '.join(values)}", file=file)
+    # Format column by column (tolist() hands the formatter native Python
+    # scalars instead of numpy ones), then stitch the rows from the string columns
+    formatted = [
+        list(map(_cell_formatter(dtype), history.iloc[:, j].to_numpy().tolist()))
+        for j, dtype in enumerate(history.dtypes)
+    ]
+    lines = [
+        f"{idx} | " + " | ".join(cells)
+        for idx, *cells in zip(history.index.tolist(), *formatted)
+    ]
+    if lines:
+        file.write("\n".join(lines))
+        file.write("\n")
 
 
 def _print_key_value_block(
@@ -290,7 +643,8 @@ def _print_key_value_block(
         print(empty_message, file=file)
         return
     max_key_len = max(len(k) for k in data.keys())
-    for key in sorted(data.keys()):
+    # Config and summary are stored key-sorted by _get_wandb_data
+    for key in data:
         value = data[key]
         if format_floats and isinstance(value, float):
             print(f"{key:<{max_key_len}} = {value:.6g}", file=file)
@@ -298,32 +652,84 @@ def _print_key_value_block(
             print(f"{key:<{max_key_len}} = {value}", file=file)
 
 
+def _dumps_json(obj) -> str:
+    """Encode obj as indented JSON, via orjson when available."""
+    if orjson is not None:
+        options = orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        try:
+            return orjson.dumps(obj, default=str, option=options).decode()
+        except orjson.JSONEncodeError:
+            pass  # e.g. ints beyond 64 bits, which bypass default=
+    return json.dumps(obj, indent=2, default=str)
+
+
+def _history_json_rows(history: pd.DataFrame) -> List[str]:
+    """Serialize history as one compact JSON object per row.
+
+    With orjson, each numeric column is encoded in a single call and rows are
+    stitched from the per-value strings, so no per-row dicts are built. Floats
+    keep their shortest round-trip repr either way.
+    """
+    frame = history.reset_index()
+    if orjson is not None and all(
+        isinstance(dt, np.dtype) and dt.kind in "biuf" for dt in frame.dtypes
+    ):
+        # Keys are escaped for str.format, values fill the {} slots
+        keys = [orjson.dumps(str(c)).decode().replace("{", "{{").replace("}", "}}") for c in frame.columns]
+        template = "{{" + ",".join(f"{key}:{{}}" for key in keys) + "}}"
+        columns = [
+            orjson.dumps(np.ascontiguousarray(col.to_numpy()), option=orjson.OPT_SERIALIZE_NUMPY)
+            .decode()[1:-1]
+            .split(",")
+            for _, col in frame.items()
+        ]
+        return [template.format(*values) for values in zip(*columns)]
+
+    # Timedeltas, nullable dtypes, etc. go through one dict per row
+    records = frame.to_dict(orient="records")
+    if orjson is not None:
+        options = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        return [orjson.dumps(row, default=str, option=options).decode() for row in records]
+    return [json.dumps(row, default=str) for row in records]
+
+
 def _output_json_v2(runs_data: List[dict], file) -> None:
-    """Output runs data as JSON (v2 format)."""
-    output = {"runs": []}
+    """Output runs data as JSON (v2 format).
+
+    Each run's metadata is encoded normally and the history records are
+    spliced in, one row per line. Rows are encoded column-wise when possible
+    (see _history_json_rows).
+    """
+    runs = []
     for data in runs_data:
         run_out = {
             "run_path": data["run_path"],
             "name": data.get("name", ""),
             "fetched_at": data.get("fetched_at", ""),
             "config": data.get("config", {}),
-            "summary": _numeric_summary(data.get("summary", {})),
+            "summary": data.get("summary", {}),
         }
-        history = data.get("history")
-        if _has_history_data(history):
-            run_out["history"] = history.reset_index().to_dict(orient="records")
-        output["runs"].append(run_out)
-
-    json.dump(output, file, indent=2, default=str)
-    file.write("\n")
+        text = _dumps_json(run_out)
+        history = data["history"]
+        if not history.empty:
+            rows = ",\n    ".join(_history_json_rows(history))
+            text = f'{text[:-2]},\n  "history": [\n    {rows}\n  ]\n}}'
+        runs.append("    " + text.replace("\n", "\n    "))
+
+    if runs:
+        file.write('{\n  "runs": [\n' + ",\n".join(runs) + "\n  ]\n}\n")
+    else:
+        file.write('{\n  "runs": []\n}\n')
 
 
 def _output_csv_v2(runs_data: List[dict], file) -> None:
     """Output runs data as CSV (history only for single run)."""
     if len(runs_data) == 1:
-        history = runs_data[0].get("history")
-        if _has_history_data(history):
-            history.reset_index().to_csv(file, index=False)
+        history = runs_data[0]["history"]
+        if not history.empty:
+            history.to_csv(
+                file, index_label="step", lineterminator="\n", chunksize=10_000
+            )
         else:
             print("# No history data", file=file)
     else:
@@ -333,7 +739,7 @@ def _output_csv_v2(runs_data: List[dict], file) -> None:
                 "run_path": data["run_path"],
                 "name": data.get("name", ""),
             }
-            row.update(_numeric_summary(data.get("summary", {})))
+            row.update(data.get("summary", {}))
             rows.append(row)
 
         if rows:
@@ -344,9 +750,9 @@ def _output_csv_v2(runs_data: List[dict], file) -> None:
                 c for c in all_cols if c not in ("run_path", "name")
             )
 
-            writer = csv.DictWriter(file, fieldnames=cols)
-            writer.writeheader()
-            writer.writerows(rows)
+            # object dtype keeps ints as ints where other runs lack the metric
+            table = pd.DataFrame(rows, columns=cols, dtype=object)
+            table.to_csv(file, index=False, lineterminator="\n")
 
 
 def _output_single_run_agent(
@@ -361,8 +767,9 @@ def _output_single_run_agent(
     name = data.get("name", "unknown")
     fetched_at = data.get("fetched_at", "")
     config = data.get("config", {})
-    summary = _numeric_summary(data.get("summary", {}))
-    history = data.get("history")
+    summary = data.get("summary", {})
+    history = data["history"]
+    sorted_cols = sorted(history.columns)
 
     print(f"# Run: {name} ({run_path})", file=file)
     if fetched_at:
@@ -373,19 +780,28 @@ def _output_single_run_agent(
         print("[SCHEMA]", file=file)
         print(f"# Metric schema for run: {name} ({run_path})", file=file)
         print("#", file=file)
-        if _has_history_data(history):
+        if not history.empty:
             print(f"# METRICS ({len(history.columns)} total):", file=file)
             print("# Name                          | Type  | Range", file=file)
-            for col in sorted(history.columns):
-                dtype = (
-                    "float"
-                    if pd.api.types.is_float_dtype(history[col].dtype)
-                    else str(history[col].dtype)
+            # Reduce the whole float64 buffer at once; all-NaN columns are left
+            # out so nanmin/nanmax never see an empty slice
+            values = history.to_numpy(dtype=np.float64, na_value=np.nan)
+            has_data = ~np.isnan(values).all(axis=0)
+            with_data = values[:, has_data]
+            ranges = dict(
+                zip(
+                    history.columns[has_data],
+                    zip(np.nanmin(with_data, axis=0).tolist(), np.nanmax(with_data, axis=0).tolist()),
                 )
-                col_data = history[col].dropna()
-                if not col_data.empty:
-                    min_val = col_data.min()
-                    max_val = col_data.max()
+            )
+            type_names = {
+                col: "float" if dtype.kind == "f" else str(dtype)
+                for col, dtype in history.dtypes.items()
+            }
+            for col in sorted_cols:
+                dtype = type_names[col]
+                if col in ranges:
+                    min_val, max_val = ranges[col]
                     print(f"{col:<32} | {dtype:<5} | [{min_val:.3g}, {max_val:.3g}]", file=file)
                 else:
                     print(f"{col:<32} | {dtype:<5} | [no data]", file=file)
@@ -396,38 +812,25 @@ def _output_single_run_agent(
 
     if show_stats:
         print("[STATS]", file=file)
-        if _has_history_data(history):
-            stats_data = []
-            for col in sorted(history.columns):
-                col_data = history[col].dropna()
-                if not col_data.empty:
-                    row = {
-                        "metric": col,
-                        "min": col_data.min(),
-                        "p10": col_data.quantile(0.1),
-                        "p25": col_data.quantile(0.25),
-                        "p50": col_data.quantile(0.5),
-                        "p75": col_data.quantile(0.75),
-                        "p90": col_data.quantile(0.9),
-                        "max": col_data.max(),
-                    }
-                    stats_data.append(row)
+        if not history.empty:
+            # A single nanquantile pass; q=0 and q=1 are the min and max. All-NaN
+            # columns are dropped up front, matching count() == 0 before
+            values = history.to_numpy(dtype=np.float64, na_value=np.nan)
+            has_data = ~np.isnan(values).all(axis=0)
+            quantiles = np.nanquantile(values[:, has_data], STATS_QUANTILES, axis=0)
+            stats_by_col = dict(zip(history.columns[has_data], quantiles.T.tolist()))
+            stats_data = [(col, stats_by_col[col]) for col in sorted_cols if col in stats_by_col]
 
             if stats_data:
-                max_name_len = max(len(r["metric"]) for r in stats_data)
-                header = (
-                    f"{'metric':<{max_name_len}} | {'min':>8} | {'p10':>8} | {'p25':>8} | "
-                    f"{'p50':>8} | {'p75':>8} | {'p90':>8} | {'max':>8}"
+                max_name_len = max(len(col) for col, _ in stats_data)
+                header = f"{'metric':<{max_name_len}} | " + " | ".join(
+                    f"{label:>8}" for label in ("min", "p10", "p25", "p50", "p75", "p90", "max")
                 )
                 print(header, file=file)
                 print("-" * len(header), file=file)
-                for row in stats_data:
-                    print(
-                        f"{row['metric']:<{max_name_len}} | {row['min']:>8.4g} | "
-                        f"{row['p10']:>8.4g} | {row['p25']:>8.4g} | {row['p50']:>8.4g} | "
-                        f"{row['p75']:>8.4g} | {row['p90']:>8.4g} | {row['max']:>8.4g}",
-                        file=file,
-                    )
+                for col, stats in stats_data:
+                    cells = " | ".join(f"{stat:>8.4g}" for stat in stats)
+                    print(f"{col:<{max_name_len}} | {cells}", file=file)
         else:
             print("# (no history data)", file=file)
         print("", file=file)
@@ -443,7 +846,7 @@ def _output_single_run_agent(
 
     if not human_mode:
         print("[HISTORY]", file=file)
-        if _has_history_data(history):
+        if not history.empty:
             _print_history_table(history, file)
         else:
             print("# (no history data)", file=file)
@@ -473,15 +876,17 @@ def _output_comparison_agent(
     print("[CONFIG_DIFF]", file=file)
     print("# Parameters that differ between runs:", file=file)
 
-    all_config_keys = set()
-    for d in runs_data:
-        all_config_keys.update(d.get("config", {}).keys())
-
-    diff_keys = []
-    for key in sorted(all_config_keys):
-        values = [d.get("config", {}).get(key) for d in runs_data]
-        if len(set(str(v) for v in values)) > 1:
-            diff_keys.append(key)
+    # One row per run; missing keys read as None, matching config.get(key)
+    configs = pd.DataFrame([d.get("config", {}) for d in runs_data], dtype=object)
+    configs = configs.where(configs.notna(), None)
+    # Elementwise object/type comparison against the first run picks out the
+    # candidate keys; only those pay for str() to confirm, since differences are
+    # judged on string forms (which also lets unhashable lists be counted)
+    values = configs.to_numpy()
+    types = np.frompyfunc(type, 1, 1)(values)
+    differs = ((values != values[:1]) | (types != types[:1])).any(axis=0)
+    n_distinct = configs.loc[:, differs].astype(str).nunique(dropna=False)
+    diff_keys = sorted(n_distinct.index[n_distinct > 1])
 
     if diff_keys:
         name_widths = [max(len(name), 12) for name in run_names]
@@ -506,19 +911,16 @@ def _output_comparison_agent(
 
     print("[SUMMARY_COMPARISON]", file=file)
 
-    run_summaries = [_numeric_summary(run.get("summary", {})) for run in runs_data]
+    run_summaries = [run.get("summary", {}) for run in runs_data]
     all_summary_keys = {key for summary in run_summaries for key in summary.keys()}
 
     if all_summary_keys and len(runs_data) >= 2:
-        filtered_keys = []
-        for key in sorted(all_summary_keys):
-            values = [summary.get(key) for summary in run_summaries]
-            if not show_all:
-                all_present = all(v is not None for v in values)
-                if not all_present:
-                    continue
-
-            filtered_keys.append(key)
+        if show_all:
+            filtered_keys = sorted(all_summary_keys)
+        else:
+            # Keep only metrics reported by every run
+            present = pd.DataFrame(run_summaries).notna().all()
+            filtered_keys = sorted(present.index[present])
 
         if filtered_keys:
             name_widths = [max(len(name), 12) for name in run_names]
@@ -572,8 +974,8 @@ def _output_comparison_agent(
         print("[HISTORY_COMPARISON]", file=file)
         histories = []
         for i, d in enumerate(runs_data):
-            h = d.get("history")
-            if _has_history_data(h):
+            h = d["history"]
+            if not h.empty:
                 h = h.copy()
                 # Use run index to avoid column clashes when run names duplicate
                 h.columns = [f"{c} (run{i})" for c in h.columns]
@@ -582,11 +984,8 @@ def _output_comparison_agent(
         if not histories:
             print("# (no history data)", file=file)
         else:
-            # Outer join on step
-            merged = histories[0][1]
-            for _, h in histories[1:]:
-                merged = merged.join(h, how="outer")
-            merged = merged.sort_index()
+            # Outer join on step, aligning all runs in a single pass
+            merged = pd.concat([h for _, h in histories], axis=1, join="outer").sort_index()
 
             if not show_all:
                 merged = merged.dropna(how="any")
@@ -608,28 +1007,32 @@ def _output_agent_format(
     show_all: bool = False,
 ) -> None:
     """Output in agent-optimized structured text format."""
-    print("# PULL-LOGS OUTPUT", file=file)
-    print("# ================", file=file)
-    print("# W&B run data optimized for agent consumption.", file=file)
-    print("#", file=file)
-    print("# WORKFLOW FOR AGENTS:", file=file)
-    print("# 1. Get schema first:   pull-logs -c <ckpt> --schema", file=file)
-    print("# 2. Get statistics:     pull-logs -c <ckpt> --stats", file=file)
-    print("# 3. Filter by metric:   pull-logs -c <ckpt> --select \"val/loss|train/loss\"", file=file)
-    print("# 4. Filter by value:    pull-logs -c <ckpt> --where \"epoch > 5\"", file=file)
-    print("# 5. Compute columns:    pull-logs -c <ckpt> --eval \"gap=train/loss - val/loss\"", file=file)
-    print("# 6. Compare runs:       pull-logs -c <ckpt1> -c <ckpt2>", file=file)
-    print("# 7. Human-readable:     pull-logs -c <ckpt> -H", file=file)
-    print("# 8. Show all rows:      pull-logs -c <ckpt> --show-all", file=file)
-    print("#", file=file)
+    # Assemble everything in memory and hit the real file with a single write
+    out = io.StringIO()
+    print("# PULL-LOGS OUTPUT", file=out)
+    print("# ================", file=out)
+    print("# W&B run data optimized for agent consumption.", file=out)
+    print("#", file=out)
+    print("# WORKFLOW FOR AGENTS:", file=out)
+    print("# 1. Get schema first:   pull-logs -c <ckpt> --schema", file=out)
+    print("# 2. Get statistics:     pull-logs -c <ckpt> --stats", file=out)
+    print("# 3. Filter by metric:   pull-logs -c <ckpt> --select \"val/loss|train/loss\"", file=out)
+    print("# 4. Filter by value:    pull-logs -c <ckpt> --where \"epoch > 5\"", file=out)
+    print("# 5. Compute columns:    pull-logs -c <ckpt> --eval \"gap=train/loss - val/loss\"", file=out)
+    print("# 6. Compare runs:       pull-logs -c <ckpt1> -c <ckpt2>", file=out)
+    print("# 7. Human-readable:     pull-logs -c <ckpt> -H", file=out)
+    print("# 8. Show all rows:      pull-logs -c <ckpt> --show-all", file=out)
+    print("#", file=out)
 
     if len(runs_data) == 1:
-        _output_single_run_agent(runs_data[0], file, show_schema, show_stats, human_mode)
+        _output_single_run_agent(runs_data[0], out, show_schema, show_stats, human_mode)
     else:
         _output_comparison_agent(
-            runs_data, file, show_schema, show_stats, human_mode, show_all
+            runs_data, out, show_schema, show_stats, human_mode, show_all
         )
 
+    file.write(out.getvalue())
+
 
 def main() -> None:
     """Pull W&B run metrics and hyperparameters (agent-optimized)."""
@@ -722,8 +1125,7 @@ def main() -> None:
         for ckpt_path in parsed.checkpoints:
             if not os.path.exists(ckpt_path):
                 _die(f"Checkpoint not found: {ckpt_path}")
-            checkpoint = _load_checkpoint(ckpt_path)
-            wandb_run_path = checkpoint.get("wandb_run_path")
+            wandb_run_path = _read_checkpoint_metadata(ckpt_path).get("wandb_run_path")
             if not wandb_run_path:
                 _die(f"Checkpoint has no wandb_run_path: {ckpt_path}")
             run_infos.append((wandb_run_path, ckpt_path))
@@ -744,9 +1146,31 @@ def main() -> None:
             unique_by_run[run_path] = ckpt_path
     run_infos = [(run_path, ckpt_path) for run_path, ckpt_path in unique_by_run.items()]
 
+    # With --select, a lone -r run only needs the selected (and --where) metrics.
+    # wandb samples a keyed history differently from the full one and drops rows
+    # missing any key, so never do this when rows must line up with another
+    # run's history or when NaN rows are shown (--show-all)
+    history_keys = None
+    single_uncached_run = len(run_infos) == 1 and run_infos[0][1] is None
+    if parsed.select and single_uncached_run and not parsed.show_all:
+        history_keys = [p.strip() for p in parsed.select.split("|") if p.strip()]
+        where_match = parsed.where and FILTER_EXPR_PATTERN.match(parsed.where.strip())
+        if where_match and where_match.group("column") != "step":
+            history_keys.append(where_match.group("column"))
+
+    # Fetches are network/disk bound, so overlap them across runs
+    with ThreadPoolExecutor(max_workers=min(8, len(run_infos))) as executor:
+        fetched = list(
+            executor.map(
+                lambda info: _get_wandb_data(
+                    *info, refresh=parsed.refresh, keys=history_keys
+                ),
+                run_infos,
+            )
+        )
+
     runs_data = []
-    for run_path, ckpt_path in run_infos:
-        data = _get_wandb_data(run_path, ckpt_path, refresh=parsed.refresh)
+    for (run_path, ckpt_path), data in zip(run_infos, fetched):
         data["run_path"] = run_path
         data["checkpoint_path"] = ckpt_path
         runs_data.append(data)
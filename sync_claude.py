@@ -10,6 +10,8 @@ directory. symlinks all leaf files.
 import os
 import argparse
 import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 # Directories to exclude when iterating (avoid symlinking contents of these)
 DEFAULT_EXCLUDE_DIRS = frozenset({
@@ -27,6 +29,19 @@ DEFAULT_EXCLUDE_DIRS = frozenset({
     ".eggs",
 })
 
+# Number of buffered per-link messages written to stdout at once (--verbose)
+LOG_FLUSH_LINES = 1024
+
+# Without --verbose, report progress about every this many files
+PROGRESS_INTERVAL = 1024
+
+# Most directories queued for linking while the walk continues
+MAX_PENDING_DIRS = 1024
+
+# Whether directories and symlinks can be created relative to an open
+# directory (mkdirat/openat/symlinkat)
+DIR_FD_SUPPORTED = {os.mkdir, os.open, os.symlink} <= os.supports_dir_fd
+
 def find_claude_directories(root_dir: str, depth: int = 1):
     """Search for .claude directories within root_dir up to `depth` levels deep."""
     root_dir = os.path.abspath(os.path.expanduser(root_dir))
@@ -35,20 +50,27 @@ def find_claude_directories(root_dir: str, depth: int = 1):
     if depth < 0:
         return found
 
-    for current_root, dirs, _files in os.walk(root_dir):
-        rel = os.path.relpath(current_root, root_dir)
-        current_depth = 0 if rel == "." else len(rel.split(os.sep))
-
-        # Stop descending if we're deeper than allowed
-        if current_depth > depth:
-            dirs[:] = []
+    # Carry the depth alongside each directory instead of re-deriving it from
+    # relative paths; the stack keeps os.walk's top-down order
+    scandir = os.scandir
+    stack = [(root_dir, 0)]
+    while stack:
+        current_root, current_depth = stack.pop()
+        subdirs = []
+        try:
+            with scandir(current_root) as it:
+                for entry in it:
+                    if entry.name == ".claude":
+                        if entry.is_dir():
+                            found.append(entry.path)
+                        # Avoid finding nested .claude under this one
+                        continue
+                    # Stop descending if we'd go deeper than allowed
+                    if current_depth < depth and entry.is_dir(follow_symlinks=False):
+                        subdirs.append((entry.path, current_depth + 1))
+        except OSError:
             continue
-
-        if ".claude" in dirs:
-            claude_path = os.path.join(current_root, ".claude")
-            found.append(os.path.abspath(claude_path))
-            # Avoid finding nested .claude under this one
-            dirs.remove(".claude")
+        stack.extend(reversed(subdirs))
 
     return found
 
@@ -61,42 +83,156 @@ def iter_file_endpoints(root: str, exclude_dirs: frozenset[str] | None = None):
     root = os.path.abspath(os.path.expanduser(root))
     exclude = exclude_dirs or DEFAULT_EXCLUDE_DIRS
 
-    for cur_root, dirs, files in os.walk(root, followlinks=False):
-        # Avoid descending into hidden dirs or common excludes
-        dirs[:] = [
-            d for d in dirs
-            if not d.startswith(".") and d not in exclude
-        ]
+    # os.scandir exposes each entry's type from the directory listing itself, so
+    # classifying entries costs no extra stat calls. Relative paths are built by
+    # concatenation on descent; the stack keeps os.walk's top-down order.
+    # Hot names are bound to locals to skip global/attribute lookups per entry.
+    sep = os.sep
+    scandir = os.scandir
+    stack = [(root, "")]
+    while stack:
+        dir_path, rel_prefix = stack.pop()
+        subdirs = []
+        try:
+            with scandir(dir_path) as it:
+                for entry in it:
+                    name = entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        # Avoid descending into hidden dirs or common excludes
+                        if not name.startswith(".") and name not in exclude:
+                            subdirs.append((entry.path, rel_prefix + name + sep))
+                    elif entry.is_symlink() and entry.is_dir():
+                        # Symlinked dirs are neither descended into nor linked
+                        continue
+                    else:
+                        yield entry.path, rel_prefix + name
+        except OSError:
+            continue
+
+        # Note: directories are handled implicitly by rel parent creation
+        stack.extend(reversed(subdirs))
 
-        for name in files:
-            src = os.path.join(cur_root, name)
-            try:
-                os.lstat(src)  # don't follow symlinks
-            except OSError:
-                continue
 
-            # Skip if it's somehow a dir entry (rare via weird FS); otherwise treat as endpoint
-            if os.path.isdir(src) and not os.path.islink(src):
-                continue
+def iter_endpoint_groups(root: str):
+    """
+    Group iter_file_endpoints(root) by directory, yielding
+    (rel_dir_from_root, [(src_abs_path, name), ...]) with rel_dir "" for root.
+    A directory's endpoints are walked consecutively, so each group is
+    complete when it is yielded.
+    """
+    rel_dir = None
+    entries = []
+    for src_abs, rel_path in iter_file_endpoints(root):
+        rel_parent, _, name = rel_path.rpartition(os.sep)
+        if rel_parent != rel_dir:
+            if entries:
+                yield rel_dir, entries
+            rel_dir = rel_parent
+            entries = []
+        entries.append((src_abs, name))
+    if entries:
+        yield rel_dir, entries
+
+
+class DirMaker:
+    """
+    Create directories under root, each (and each missing ancestor) once.
 
-            rel = os.path.relpath(src, root)
-            yield os.path.abspath(src), rel
+    Where supported, directories are made with mkdirat/openat relative to open
+    ancestor fds, so the kernel resolves one name per call rather than the
+    whole path. Fds are kept for the last directory's ancestry only: the walk
+    is depth-first, so the next directory usually shares most of it.
+    """
 
-        # Note: directories are handled implicitly by rel parent creation
+    def __init__(self, root: str):
+        self.root = root
+        self.known = set()
+        self.use_dir_fd = DIR_FD_SUPPORTED
+        self.stack = []
+        if self.use_dir_fd:
+            self.stack.append(("", os.open(root, os.O_RDONLY | os.O_DIRECTORY)))
+
+    def make(self, rel_dir: str):
+        """Create root/<rel_dir> and any missing ancestors."""
+        if not rel_dir or rel_dir in self.known:
+            return
+        sep = os.sep
+
+        if not self.use_dir_fd:
+            # Parents first, one mkdir per missing component
+            missing = []
+            while rel_dir and rel_dir not in self.known:
+                missing.append(rel_dir)
+                rel_dir = rel_dir.rpartition(sep)[0]
+            for rel in reversed(missing):
+                try:
+                    os.mkdir(self.root + sep + rel)
+                except FileExistsError:
+                    pass
+                self.known.add(rel)
+            return
+
+        # Drop open fds until the top of the stack is an ancestor of rel_dir
+        stack = self.stack
+        while len(stack) > 1 and not rel_dir.startswith(stack[-1][0] + sep):
+            os.close(stack.pop()[1])
+        top_rel, fd = stack[-1]
+
+        rest = rel_dir[len(top_rel) + 1:] if top_rel else rel_dir
+        for name in rest.split(sep):
+            top_rel = top_rel + sep + name if top_rel else name
+            if top_rel not in self.known:
+                try:
+                    os.mkdir(name, dir_fd=fd)
+                except FileExistsError:
+                    pass
+                self.known.add(top_rel)
+            fd = os.open(name, os.O_RDONLY | os.O_DIRECTORY, dir_fd=fd)
+            stack.append((top_rel, fd))
 
+    def close(self):
+        while self.stack:
+            os.close(self.stack.pop()[1])
 
-def ensure_parent_dir(path: str):
-    parent = os.path.dirname(path)
-    if parent:
-        os.makedirs(parent, exist_ok=True)
 
+def link_directory(parent_dir: str, entries: list[tuple[str, str]]) -> list[bool]:
+    """
+    Symlink each (src_abs_path, name) entry into parent_dir.
 
-def clean_old_symlinks(claude_dir: str):
+    Returns one flag per entry: True if the link was created, False if
+    something already existed at that name.
+    """
+    # Open the directory once and create links relative to it (symlinkat),
+    # sparing the kernel a full path walk per link. Falls back to plain paths
+    # where unsupported.
+    dir_fd = os.open(parent_dir, os.O_RDONLY | os.O_DIRECTORY) if DIR_FD_SUPPORTED else None
+    created = []
+    try:
+        for src_abs, name in entries:
+            # Create symlink pointing to the source absolute path; an existing entry
+            # makes symlink() fail, so no separate lexists() probe is needed
+            try:
+                if dir_fd is not None:
+                    os.symlink(src_abs, name, dir_fd=dir_fd)
+                else:
+                    os.symlink(src_abs, parent_dir + os.sep + name)
+            except FileExistsError:
+                created.append(False)
+            else:
+                created.append(True)
+    finally:
+        if dir_fd is not None:
+            os.close(dir_fd)
+    return created
+
+
+def clean_old_symlinks(claude_dir: str, verbose: bool = True):
     """
     Remove all symlinks in all subdirectories of the .claude directory.
     
     Args:
         claude_dir: Path to the .claude directory to clean
+        verbose: Print each removed symlink (failures are always printed)
     """
     claude_dir = os.path.abspath(os.path.expanduser(claude_dir))
     
@@ -105,16 +241,33 @@ def clean_old_symlinks(claude_dir: str):
     
     removed = 0
     
-    for root, dirs, files in os.walk(claude_dir):
-        for name in files + dirs:
-            path = os.path.join(root, name)
-            if os.path.islink(path):
-                try:
-                    os.unlink(path)
+    # scandir reports symlinks from the directory listing itself, so only the
+    # links found need any further syscalls
+    stack = [claude_dir]
+    while stack:
+        dir_path = stack.pop()
+        file_links, dir_links, subdirs = [], [], []
+        try:
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    if entry.is_symlink():
+                        # Links to directories go last, as os.walk listed them
+                        (dir_links if entry.is_dir() else file_links).append(entry.path)
+                    elif entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+        except OSError:
+            continue
+
+        for path in file_links + dir_links:
+            try:
+                os.unlink(path)
+                if verbose:
                     print(f"[✓] Removed symlink: {path}")
-                    removed += 1
-                except OSError as e:
-                    print(f"[!] Failed to remove symlink {path}: {e}")
+                removed += 1
+            except OSError as e:
+                print(f"[!] Failed to remove symlink {path}: {e}")
+
+        stack.extend(reversed(subdirs))
     
     print(f"\nCleaned {removed} symlink(s) from {claude_dir}")
 
@@ -134,6 +287,7 @@ def main():
     )
     parser.add_argument(
         "--depth",
+        type=int,
         default=1,
         help="Depth to search for .claude directories (default: 1)",
     )
@@ -142,6 +296,12 @@ def main():
         action="store_true",
         help="Clean all symlinks in all subdirectories of the .claude directory",
     )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Print every symlink linked, skipped or removed (default: progress and totals only)",
+    )
     args = parser.parse_args()
     
     # print version of python and location of executable\
@@ -169,28 +329,74 @@ def main():
     os.makedirs(tgt_root, exist_ok=True)
 
     if args.clean_old_symlinks:
-        clean_old_symlinks(tgt_root)
+        clean_old_symlinks(tgt_root, verbose=args.verbose)
 
     linked = 0
     skipped = 0
+    verbose = args.verbose
+    # Per-link messages (--verbose) are batched into a few large writes
+    log_lines = []
     
     print(f"Syncing {src_root} to {tgt_root}")
 
-    for src_abs, rel_path in iter_file_endpoints(src_root):
-        tgt_abs = os.path.join(tgt_root, rel_path)
-
-        if os.path.lexists(tgt_abs):
-            
-            print(f"\n[x] Exists, skipping: {tgt_abs}")
-            skipped += 1
-            continue
-
-        ensure_parent_dir(tgt_abs)
-
-        # Create symlink pointing to the source absolute path
-        os.symlink(src_abs, tgt_abs)
-        print(f"\n[✓] Linked: {src_abs} ->\n            {tgt_abs}")
-        linked += 1
+    # tgt_root is absolute and rel paths use os.sep, so plain concatenation
+    # builds the same paths as os.path.join/dirname without re-parsing them
+    tgt_prefix = tgt_root + os.sep
+
+    # Directories are linked concurrently as soon as the walk completes them,
+    # overlapping directory reads with symlink() calls (which block on path
+    # resolution and the filesystem journal with the GIL released). Results are
+    # consumed in submission order so the log follows traversal order, and at
+    # most MAX_PENDING_DIRS directories are in flight at once.
+    dir_maker = DirMaker(tgt_root)
+    pending = deque()
+    groups = iter_endpoint_groups(src_root)
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            while True:
+                group = next(groups, None)
+                if group is not None:
+                    rel_parent, entries = group
+                    # Each target directory (and any missing ancestor) is made
+                    # once, before the links that need it
+                    dir_maker.make(rel_parent)
+
+                    parent_dir = tgt_prefix + rel_parent if rel_parent else tgt_root
+                    future = executor.submit(link_directory, parent_dir, entries)
+                    pending.append((parent_dir, entries, future))
+
+                while pending and (group is None or len(pending) > MAX_PENDING_DIRS):
+                    parent_dir, entries, future = pending.popleft()
+                    created = future.result()
+                    processed = linked + skipped
+                    n_linked = sum(created)
+                    linked += n_linked
+                    skipped += len(created) - n_linked
+
+                    if not verbose:
+                        if (linked + skipped) // PROGRESS_INTERVAL > processed // PROGRESS_INTERVAL:
+                            print(
+                                f"[…] Processed {linked + skipped} files "
+                                f"(linked: {linked}, skipped: {skipped})"
+                            )
+                        continue
+                    for (src_abs, name), was_created in zip(entries, created):
+                        tgt_abs = parent_dir + os.sep + name
+                        if was_created:
+                            log_lines.append(f"\n[✓] Linked: {src_abs} ->\n            {tgt_abs}\n")
+                        else:
+                            log_lines.append(f"\n[x] Exists, skipping: {tgt_abs}\n")
+
+                        if len(log_lines) >= LOG_FLUSH_LINES:
+                            sys.stdout.write("".join(log_lines))
+                            log_lines.clear()
+
+                if group is None:
+                    break
+        finally:
+            dir_maker.close()
+            sys.stdout.write("".join(log_lines))
 
     print(f"\nDone. Linked: {linked}, Skipped: {skipped}")
 